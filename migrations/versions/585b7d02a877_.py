@@ -0,0 +1,35 @@
+"""unique index on favorites targets
+
+Revision ID: 585b7d02a877
+Revises: efc52f970b2f
+Create Date: 2026-10-19 15:02:17.334815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '585b7d02a877'
+down_revision = 'efc52f970b2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Se conserva el favorito más antiguo de cada grupo de duplicados
+    op.execute(
+        "DELETE FROM favorites WHERE id NOT IN ("
+        " SELECT MIN(id) FROM favorites GROUP BY user_id,"
+        " COALESCE(character_id, 0), COALESCE(episode_id, 0), COALESCE(location_id, 0))"
+    )
+    op.create_index('uq_favorites_target', 'favorites', [
+        'user_id',
+        sa.text('COALESCE(character_id, 0)'),
+        sa.text('COALESCE(episode_id, 0)'),
+        sa.text('COALESCE(location_id, 0)'),
+    ], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_favorites_target', table_name='favorites')
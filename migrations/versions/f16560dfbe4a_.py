@@ -0,0 +1,59 @@
+"""add indexes on foreign keys and lookup columns
+
+Revision ID: f16560dfbe4a
+Revises: c27a6ce8f0d7
+Create Date: 2026-10-19 09:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f16560dfbe4a'
+down_revision = 'c27a6ce8f0d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_characters_origin_id'), ['origin_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_characters_location_id'), ['location_id'], unique=False)
+
+    with op.batch_alter_table('character_episode', schema=None) as batch_op:
+        # La PK (character_id, episode_id) no sirve para buscar por episode_id
+        batch_op.create_index('ix_character_episode_episode_id', ['episode_id', 'character_id'], unique=False)
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        # Cubre el FK user_id y la comprobación de duplicados de add_favorite_to_user
+        batch_op.create_index('ix_favorites_user_lookup', ['user_id', 'character_id', 'episode_id', 'location_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_favorites_character_id'), ['character_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_favorites_episode_id'), ['episode_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_favorites_location_id'), ['location_id'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            # login(): index-only scan por email. En otras bases de datos, sin
+            # INCLUDE, solo duplicaría el índice único de email
+            batch_op.create_index('ix_users_email_login', ['email'], unique=False,
+                                  postgresql_include=['id', 'password', 'is_active'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.drop_index('ix_users_email_login')
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_favorites_location_id'))
+        batch_op.drop_index(batch_op.f('ix_favorites_episode_id'))
+        batch_op.drop_index(batch_op.f('ix_favorites_character_id'))
+        batch_op.drop_index('ix_favorites_user_lookup')
+
+    with op.batch_alter_table('character_episode', schema=None) as batch_op:
+        batch_op.drop_index('ix_character_episode_episode_id')
+
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_characters_location_id'))
+        batch_op.drop_index(batch_op.f('ix_characters_origin_id'))
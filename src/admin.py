@@ -45,6 +45,10 @@ class ViewFavorite(ModelView):
     # Filtros para la búsqueda en favoritos de cada usuario
     column_filters = ['user.email', 'character.name']
 
+# Vista para modelos con contador de versión: lo mantiene SQLAlchemy, no el formulario
+class VersionedModelView(ModelView):
+    form_excluded_columns = ['version']
+
 # Configuración de Flask-Admin
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample_key')
@@ -54,6 +58,6 @@ def setup_admin(app):
     # Modelos de Admin
     admin.add_view(UserAdmin(User, db.session))
     admin.add_view(ModelView(Character, db.session))
-    admin.add_view(ModelView(Episode, db.session))
-    admin.add_view(ModelView(Location, db.session))
+    admin.add_view(VersionedModelView(Episode, db.session))
+    admin.add_view(VersionedModelView(Location, db.session))
     admin.add_view(ViewFavorite(Favorite, db.session))
@@ -1,10 +1,22 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_migrate import Migrate
 from flask_cors import CORS
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
-from utils import APIException, generate_sitemap
+from utils import MAX_ID, build_route_catalog, parse_id_list
+from errors import error_response, register_error_handlers
+from metrics import route_metrics
+from fragments import (fragment_cache, encode, splice_array, splice_object, json_response,
+                       location_fragment, encode_character, encode_favorite, encode_pending_favorite,
+                       encode_user)
 from admin import setup_admin
+from coalesce import coalesced, flight
+from importer import import_command
+from plan_check import check_plans_command
+from favorites_buffer import favorite_buffer, favorite_key, ADD, REMOVE, COLUMNS as FAVORITE_COLUMNS
 from models import db, User, Character, Episode, Location, Favorite
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, JWTManager
 
@@ -18,45 +30,106 @@ if db_url:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['MAX_BATCH_IDS'] = int(os.getenv("MAX_BATCH_IDS", 100))
+
+# Favoritos en modo write-behind (desactivado por defecto)
+app.config['FAVORITES_WRITE_BEHIND'] = os.getenv("FAVORITES_WRITE_BEHIND", "false").lower() in ("1", "true")
+app.config['FAVORITES_FLUSH_SIZE'] = int(os.getenv("FAVORITES_FLUSH_SIZE", 500))
+app.config['FAVORITES_FLUSH_INTERVAL'] = float(os.getenv("FAVORITES_FLUSH_INTERVAL", 1.0))
+app.config['FAVORITES_MAX_PENDING'] = int(os.getenv("FAVORITES_MAX_PENDING", app.config['FAVORITES_FLUSH_SIZE'] * 4))
 
 MIGRATE = Migrate(app, db)
 db.init_app(app)
 CORS(app)
 setup_admin(app)
+app.cli.add_command(import_command)
+app.cli.add_command(check_plans_command)
+favorite_buffer.init_app(app)
 
 # Configuración de JWT
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "lynda2025")
 jwt = JWTManager(app)
 
-# Manejo de errores
-@app.errorhandler(APIException)
-def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code
+# Manejo de errores y métricas por ruta
+register_error_handlers(app)
+route_metrics.init_app(app)
 
-# Generación de sitemap
+# Sitemap y descripción OpenAPI, precalculados al final de este fichero
 @app.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return ROUTE_CATALOG["sitemap"].response()
+
+@app.route('/openapi.json', methods=['GET'])
+def openapi():
+    return ROUTE_CATALOG["openapi"].response()
+
+# Health checks
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return Response(b"ok", mimetype="text/plain")
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    try:
+        db.session.execute(text("SELECT 1"))
+    except SQLAlchemyError:
+        db.session.rollback()
+        return jsonify({"status": "unavailable", "pool": db.engine.pool.status()}), 503
+    return jsonify({"status": "ready", "pool": db.engine.pool.status()}), 200
+
+# Métricas del proceso
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "coalescing": flight.stats(),
+        "favorites_buffer": favorite_buffer.stats(),
+        "routes": route_metrics.snapshot(),
+        "fragments": fragment_cache.stats(),
+    }), 200
+
+# Relaciones que se cargan por lotes (una consulta IN por relación) en vez de una por fila
+CHARACTER_LOADS = (selectinload(Character.origin), selectinload(Character.location), selectinload(Character.episodes))
+EPISODE_LOADS = (selectinload(Episode.characters),)
+
+# Multi-get: GET /<recurso>?ids=1,2,3 (o ?ids=1&ids=2,3)
+def get_batch(model, raw_ids, loads=(), encoder=None):
+    """raw_ids: los valores de todos los parámetros ids de la petición."""
+    try:
+        ids = parse_id_list(",".join(raw_ids), app.config['MAX_BATCH_IDS'])
+    except ValueError as error:
+        return error_response(str(error), 400)
+
+    encoder = encoder or (lambda row: encode(row.serialize()))
+    rows = model.query.options(*loads).filter(model.id.in_(ids)).all()
+    by_id = {row.id: row for row in rows}
+    return json_response(splice_object({
+        "results": splice_array([encoder(by_id[id]) for id in ids if id in by_id]),
+        "missing": encode([id for id in ids if id not in by_id]),
+    }))
 
 # Users
 
+# Las rutas de usuarios no usan @coalesced: una lectura compartida podría no ver
+# los favoritos recién añadidos, y ambas aplican el buffer de write-behind
+
 @app.route('/users', methods=['GET'])
 def get_users():
     users = User.query.all()
-    return jsonify([user.serialize() for user in users]), 200
+    pending = favorite_buffer.pending_by_user() if favorite_buffer.enabled else {}
+    return json_response(splice_array([serialize_user(user, pending.get(user.id, {})) for user in users]))
 
 @app.route('/users/<int:id>', methods=['GET'])
 def get_user(id):
     user = User.query.get(id)
     if not user:
-        return jsonify({"msg": "User not found"}), 404
-    return jsonify(user.serialize()), 200
+        return error_response("User not found", 404)
+    return json_response(serialize_user(user))
 
 @app.route('/users', methods=['POST'])
 def create_user():
     data = request.json
     if not data or not data.get("email") or not data.get("password"):
-        return jsonify({"msg": "Email and password are required"}), 400
+        return error_response("Email and password are required", 400)
 
     hashed_password = generate_password_hash(data["password"])
 
@@ -73,11 +146,11 @@ def login():
     password = request.json.get("password")
 
     if not email or not password:
-        return jsonify({"msg": "Email and password are required"}), 400
+        return error_response("Email and password are required", 400)
 
     user = User.query.filter_by(email=email).first()
     if not user or not check_password_hash(user.password, password):
-        return jsonify({"msg": "Invalid credentials"}), 401
+        return error_response("Invalid credentials", 401)
 
     access_token = create_access_token(identity=email)
     return jsonify(access_token=access_token), 200
@@ -91,23 +164,27 @@ def get_infoperfil():
 # Characters
 
 @app.route('/characters', methods=['GET'])
+@coalesced
 def get_characters():
-    characters = Character.query.all()
-    return jsonify([character.serialize() for character in characters]), 200
+    if "ids" in request.args:
+        return get_batch(Character, request.args.getlist("ids"), CHARACTER_LOADS, encode_character)
+    characters = Character.query.options(*CHARACTER_LOADS).all()
+    return json_response(splice_array([encode_character(character) for character in characters]))
 
 @app.route('/characters/<int:id>', methods=['GET'])
+@coalesced
 def get_character(id):
     character = Character.query.get(id)
     if not character:
-        return jsonify({"msg": "Character not found"}), 404
-    return jsonify(character.serialize()), 200
+        return error_response("Character not found", 404)
+    return json_response(encode_character(character))
 
 @app.route('/characters', methods=['POST'])
 @jwt_required()
 def create_character():
     data = request.json
     if not data:
-        return jsonify({"msg": "No input data provided"}), 400
+        return error_response("No input data provided", 400)
 
     new_character = Character(
         name=data.get("name"),
@@ -120,20 +197,24 @@ def create_character():
     )
     db.session.add(new_character)
     db.session.commit()
-    return jsonify(new_character.serialize()), 201
+    return json_response(encode_character(new_character), 201)
 
 # Episodes
 
 @app.route('/episodes', methods=['GET'])
+@coalesced
 def get_episodes():
-    episodes = Episode.query.all()
+    if "ids" in request.args:
+        return get_batch(Episode, request.args.getlist("ids"), EPISODE_LOADS)
+    episodes = Episode.query.options(*EPISODE_LOADS).all()
     return jsonify([episode.serialize() for episode in episodes]), 200
 
 @app.route('/episodes/<int:id>', methods=['GET'])
+@coalesced
 def get_episode(id):
     episode = Episode.query.get(id)
     if not episode:
-        return jsonify({"msg": "Episode not found"}), 404
+        return error_response("Episode not found", 404)
     return jsonify(episode.serialize()), 200
 
 @app.route('/episodes', methods=['POST'])
@@ -141,7 +222,7 @@ def get_episode(id):
 def create_episode():
     data = request.json
     if not data:
-        return jsonify({"msg": "No input data provided"}), 400
+        return error_response("No input data provided", 400)
 
     new_episode = Episode(
         name=data.get("name"),
@@ -155,23 +236,27 @@ def create_episode():
 # Locations
 
 @app.route('/locations', methods=['GET'])
+@coalesced
 def get_locations():
+    if "ids" in request.args:
+        return get_batch(Location, request.args.getlist("ids"), encoder=location_fragment)
     locations = Location.query.all()
-    return jsonify([location.serialize() for location in locations]), 200
+    return json_response(splice_array([location_fragment(location) for location in locations]))
 
 @app.route('/locations/<int:id>', methods=['GET'])
+@coalesced
 def get_location(id):
     location = Location.query.get(id)
     if not location:
-        return jsonify({"msg": "Location not found"}), 404
-    return jsonify(location.serialize()), 200
+        return error_response("Location not found", 404)
+    return json_response(location_fragment(location))
 
 @app.route('/locations', methods=['POST'])
 @jwt_required()
 def create_location():
     data = request.json
     if not data:
-        return jsonify({"msg": "No input data provided"}), 400
+        return error_response("No input data provided", 400)
 
     new_location = Location(
         name=data.get("name"),
@@ -183,36 +268,125 @@ def create_location():
     return jsonify(new_location.serialize()), 201
 
 # Favorites
+
+def read_favorite_key(user_id):
+    """Devuelve (user_id, character_id, episode_id, location_id) o None si la entrada no es válida."""
+    data = request.json
+    if not data:
+        return None
+    ids = []
+    for field in ("character_id", "episode_id", "location_id"):
+        value = data.get(field)
+        if value in (None, ""):
+            ids.append(None)
+            continue
+        # Solo enteros JSON de verdad (ni bool, ni 1.9, ni "1"); 0 no es un id y
+        # chocaría con el COALESCE(x, 0) de uq_favorites_target
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= MAX_ID:
+            return None
+        ids.append(value)
+    if not any(ids):
+        return None  # Verifica que al menos un ID esté presente
+    return (user_id, *ids)
+
+def favorite_exists(key):
+    return Favorite.query.filter_by(
+        user_id=key[0], character_id=key[1], episode_id=key[2], location_id=key[3]
+    ).first() is not None
+
+def missing_favorite_target(key):
+    """Nombre del primer destino que no existe, o None. Una consulta por clave primaria por destino."""
+    for model, id in zip((Character, Episode, Location), key[1:]):
+        if id is not None and db.session.get(model, id) is None:
+            return model.__name__
+    return None
+
+def encode_pending(user, key):
+    targets = [db.session.get(model, id) if id is not None else None
+               for model, id in zip((Character, Episode, Location), key[1:])]
+    return encode_pending_favorite(user.email, *targets)
+
+def serialize_user(user, pending=None):
+    """pending: operaciones del buffer para este usuario, si ya se han leído."""
+    if favorite_buffer.enabled:
+        # Read-your-writes: se aplican las operaciones que siguen en el buffer
+        if pending is None:
+            pending = favorite_buffer.pending_for(user.id)
+        if pending:
+            favorites = [encode_favorite(favorite) for favorite in user.favorites
+                         if pending.get(favorite_key(favorite)) != REMOVE]
+            favorites += [encode_pending(user, key) for key, op in pending.items() if op == ADD]
+            return encode_user(user, favorites)
+    return encode_user(user)
+
 @app.route('/users/<int:user_id>/favorites', methods=['POST'])
 @jwt_required()
 def add_favorite_to_user(user_id):
     user = User.query.get(user_id)
     if not user:
-        return jsonify({"msg": "User not found"}), 404
+        return error_response("User not found", 404)
 
-    data = request.json
-    if not data or not any([data.get("character_id"), data.get("episode_id"), data.get("location_id")]):
-        return jsonify({"msg": "Invalid input"}), 400  # Verifica que al menos un ID esté presente
-
-    existing_favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        character_id=data.get("character_id"),
-        episode_id=data.get("episode_id"),
-        location_id=data.get("location_id")
-    ).first()
-    
-    if existing_favorite:
-        return jsonify({"msg": "Favorite already added"}), 409
+    key = read_favorite_key(user_id)
+    if not key:
+        return error_response("Invalid input", 400)
+
+    missing = missing_favorite_target(key)
+    if missing:
+        return error_response(missing + " not found", 404)
+
+    if favorite_buffer.enabled:
+        result = favorite_buffer.submit(key, ADD, favorite_exists)
+        if result == "full":
+            return error_response("Favorites are temporarily unavailable", 503)
+        if result == "duplicate":
+            return error_response("Favorite already added", 409)
+        # Acuse sin consultas extra: solo los ids que quedan en cola
+        return json_response(encode(dict(zip(FAVORITE_COLUMNS, key))), 202)
+
+    if favorite_exists(key):
+        return error_response("Favorite already added", 409)
 
     new_favorite = Favorite(
         user_id=user_id,
-        character_id=data.get("character_id"),
-        episode_id=data.get("episode_id"),
-        location_id=data.get("location_id")
+        character_id=key[1],
+        episode_id=key[2],
+        location_id=key[3]
     )
     db.session.add(new_favorite)
     db.session.commit()
-    return jsonify(new_favorite.serialize()), 201
+    return json_response(encode_favorite(new_favorite), 201)
+
+@app.route('/users/<int:user_id>/favorites', methods=['DELETE'])
+@jwt_required()
+def remove_favorite_from_user(user_id):
+    user = User.query.get(user_id)
+    if not user:
+        return error_response("User not found", 404)
+
+    key = read_favorite_key(user_id)
+    if not key:
+        return error_response("Invalid input", 400)
+
+    if favorite_buffer.enabled:
+        result = favorite_buffer.submit(key, REMOVE, favorite_exists)
+        if result == "full":
+            return error_response("Favorites are temporarily unavailable", 503)
+        if result == "not_found":
+            return error_response("Favorite not found", 404)
+        return jsonify({"msg": "Favorite removal queued"}), 202
+
+    favorite = Favorite.query.filter_by(
+        user_id=user_id, character_id=key[1], episode_id=key[2], location_id=key[3]
+    ).first()
+    if not favorite:
+        return error_response("Favorite not found", 404)
+
+    db.session.delete(favorite)
+    db.session.commit()
+    return jsonify({"msg": "Favorite removed"}), 200
+
+# Con todas las rutas ya registradas
+ROUTE_CATALOG = build_route_catalog(app)
 
 # Runer server
 
@@ -0,0 +1,84 @@
+import threading
+from functools import wraps
+from flask import Response, current_app, request
+
+# Single-flight: si varias peticiones GET idénticas llegan a la vez al mismo
+# proceso, solo una ejecuta la consulta y la serialización; el resto espera y
+# reutiliza los mismos bytes ya codificados.
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            leaders, followers, in_flight = self.leaders, self.followers, len(self._calls)
+        total = leaders + followers
+        return {
+            "leaders": leaders,
+            "followers": followers,
+            "in_flight": in_flight,
+            "coalescing_ratio": round(followers / total, 4) if total else 0.0,
+        }
+
+flight = SingleFlight()
+
+def _request_key():
+    # Misma ruta, mismos argumentos (sin importar el orden entre parámetros
+    # distintos; ?ids=1&ids=2 y ?ids=2&ids=1 dan resultados en otro orden) y
+    # misma forma de respuesta
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True), key=lambda item: item[0])),
+        request.accept_mimetypes.best,
+    )
+
+def _encode(rv):
+    response = current_app.make_response(rv)
+    return response.status_code, response.mimetype, response.get_data()
+
+def coalesced(view):
+    """Decorador para vistas GET de solo lectura."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        status, mimetype, body = flight.do(_request_key(), lambda: _encode(view(*args, **kwargs)))
+        return Response(body, status=status, mimetype=mimetype)
+    return wrapper
@@ -0,0 +1,92 @@
+import json
+import logging
+from flask import Response
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.exceptions import HTTPException, InternalServerError
+from werkzeug.http import HTTP_STATUS_CODES
+from models import db
+from utils import APIException
+
+# Manejo de errores unificado. Los cuerpos de los mensajes fijos se codifican
+# una sola vez al importar y se reutilizan, así que una avalancha de 404/409
+# cuesta lo mismo o menos que una respuesta correcta. Los mensajes que llevan
+# datos del cliente ("Invalid id: ...") se codifican en cada respuesta: si se
+# guardaran, una avalancha de entradas distintas desplazaría a los fijos. Los
+# errores de base de datos deshacen la sesión y se traducen a 409 (duplicado),
+# 422 (datos inválidos) o 503.
+
+logger = logging.getLogger(__name__)
+
+# Códigos SQLSTATE de Postgres
+UNIQUE_VIOLATION = "23505"
+
+# Mensajes fijos de src/app.py y de classify_db_error
+MESSAGES = (
+    "User not found", "Character not found", "Episode not found", "Location not found",
+    "Favorite not found", "Favorite already added", "Favorites are temporarily unavailable",
+    "Email and password are required", "Invalid credentials", "No input data provided",
+    "Invalid input", "At least one id is required", "Internal server error",
+    "Resource already exists", "Invalid or missing related data", "Resource was modified concurrently",
+    "Invalid data", "Database unavailable", "Database error",
+)
+
+def encode_body(body):
+    return json.dumps(body, separators=(",", ":")).encode("utf-8") + b"\n"
+
+ENCODED_ERRORS = {
+    message: encode_body({"msg": message})
+    # HTTP_STATUS_CODES da los error.name que devuelve handle_http_error
+    for message in MESSAGES + tuple(HTTP_STATUS_CODES.values())
+}
+
+def encode_error(message):
+    body = ENCODED_ERRORS.get(message)
+    return body if body is not None else encode_body({"msg": message})
+
+def error_response(message, status):
+    return Response(encode_error(message), status=status, mimetype="application/json")
+
+def classify_db_error(error):
+    if isinstance(error, IntegrityError):
+        pgcode = getattr(error.orig, "pgcode", None)
+        if pgcode == UNIQUE_VIOLATION or "unique constraint" in str(error.orig).lower():
+            return 409, "Resource already exists"
+        return 422, "Invalid or missing related data"
+    if isinstance(error, StaleDataError):
+        return 409, "Resource was modified concurrently"
+    if isinstance(error, DataError):
+        return 422, "Invalid data"
+    if isinstance(error, OperationalError):
+        return 503, "Database unavailable"
+    return 500, "Database error"
+
+def register_error_handlers(app):
+    @app.errorhandler(APIException)
+    def handle_invalid_usage(error):
+        if error.payload:
+            return Response(encode_body(error.to_dict()), status=error.status_code, mimetype="application/json")
+        return error_response(error.message, error.status_code)
+
+    @app.errorhandler(SQLAlchemyError)
+    def handle_db_error(error):
+        db.session.rollback()
+        status, message = classify_db_error(error)
+        if status >= 500:
+            logger.error("Database error: %s", error)
+        return error_response(message, status)
+
+    @app.errorhandler(HTTPException)
+    def handle_http_error(error):
+        if error.code is None or error.code < 400:
+            return error  # Redirecciones del enrutado
+        response = error_response(error.name, error.code)
+        if getattr(error, "valid_methods", None):
+            response.headers["Allow"] = ", ".join(error.valid_methods)
+        return response
+
+    @app.errorhandler(InternalServerError)
+    def handle_unexpected_error(error):
+        # Excepciones no controladas: la sesión no debe quedar a medias
+        db.session.rollback()
+        return error_response("Internal server error", 500)
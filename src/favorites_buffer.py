@@ -0,0 +1,194 @@
+import atexit
+import logging
+import threading
+from sqlalchemy import Integer, and_, cast, exists, literal, or_, select, union_all
+from models import db, Favorite, Character, Episode, Location
+
+# Modo write-behind para favoritos: las altas y bajas se validan (incluido que
+# existan los destinos), se confirman al cliente y se guardan en memoria; un hilo las escribe agrupadas en la tabla
+# favorites cuando hay FLUSH_SIZE operaciones pendientes o como mucho cada
+# FLUSH_INTERVAL segundos (la ventana máxima de pérdida si el proceso muere).
+# Si la base de datos no acepta escrituras el buffer no crece sin límite: a
+# partir de MAX_PENDING operaciones las nuevas se rechazan sin encolarlas.
+# Un lote que falla se vuelve a encolar entero y se reintenta en el siguiente
+# flush; no se descarta ninguna operación ya confirmada.
+
+logger = logging.getLogger(__name__)
+
+ADD = "add"
+REMOVE = "remove"
+# Filas por sentencia: unos 8 parámetros y un SELECT compuesto por fila, por
+# debajo de los límites de SQLite (999 parámetros, 500 SELECT en un UNION)
+ROWS_PER_STATEMENT = 100
+COLUMNS = ("user_id", "character_id", "episode_id", "location_id")
+TARGETS = (Character, Episode, Location)
+
+def favorite_key(favorite):
+    return (favorite.user_id, favorite.character_id, favorite.episode_id, favorite.location_id)
+
+def _match(key):
+    columns = (Favorite.user_id, Favorite.character_id, Favorite.episode_id, Favorite.location_id)
+    return and_(*[column.is_(None) if value is None else column == value for column, value in zip(columns, key)])
+
+def _targets_exist(key):
+    return [exists().where(model.id == id) for model, id in zip(TARGETS, key[1:]) if id is not None]
+
+def _insert_missing(keys):
+    """INSERT ... SELECT de varias filas que solo inserta las que no existen ya.
+
+    La base de datos decide si hay duplicado: el estado del proceso no basta con
+    varios workers, y el índice único uq_favorites_target cubre las carreras que
+    queden entre transacciones concurrentes. Las filas cuyo destino se ha borrado
+    después del acuse se omiten, igual que el borrado habría eliminado el favorito.
+    """
+    selects = [
+        select(*[cast(literal(value), Integer) for value in key])
+        .where(~exists().where(_match(key)), *_targets_exist(key))
+        for key in keys
+    ]
+    query = union_all(*selects) if len(selects) > 1 else selects[0]
+    return Favorite.__table__.insert().from_select(COLUMNS, query)
+
+class FavoriteBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._inflight = {}
+        self._thread = None
+        self.flushed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("FAVORITES_WRITE_BEHIND", False)
+        self.flush_size = app.config.get("FAVORITES_FLUSH_SIZE", 500)
+        self.flush_interval = app.config.get("FAVORITES_FLUSH_INTERVAL", 1.0)
+        self.max_pending = app.config.get("FAVORITES_MAX_PENDING", self.flush_size * 4)
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def _state(self, key):
+        return self._pending.get(key, self._inflight.get(key))
+
+    def _full(self):
+        return len(self._pending) + len(self._inflight) >= self.max_pending
+
+    def submit(self, key, op, exists_in_db):
+        """Encola ADD o REMOVE. Devuelve "accepted", "duplicate", "not_found" o "full".
+
+        Anular una operación pendiente se acepta aunque el buffer esté lleno. Una
+        vez aceptada la operación, submit no lanza excepciones: la escritura la
+        hace siempre el hilo de flush.
+        """
+        exists = exists_in_db(key)
+        with self._lock:
+            state = self._state(key)
+            present = state == ADD if state else exists
+            if op == ADD and present:
+                return "duplicate"
+            if op == REMOVE and not present:
+                return "not_found"
+            if key in self._pending:
+                # La operación contraria seguía pendiente: se anulan entre sí
+                del self._pending[key]
+            elif self._full():
+                return "full"
+            else:
+                self._pending[key] = op
+            size = len(self._pending)
+
+        self._ensure_thread()
+        if size >= self.flush_size:
+            self._wakeup.set()
+        return "accepted"
+
+    def pending_for(self, user_id):
+        """Operaciones aún no escritas de un usuario, para leer lo que acaba de escribir."""
+        with self._lock:
+            ops = {key: op for key, op in self._inflight.items() if key[0] == user_id}
+            for key, op in self._pending.items():
+                if key[0] == user_id:
+                    ops[key] = op
+        return ops
+
+    def pending_by_user(self):
+        """Como pending_for, pero de todos los usuarios a la vez: {user_id: {key: op}}."""
+        by_user = {}
+        with self._lock:
+            for ops in (self._inflight, self._pending):
+                for key, op in ops.items():
+                    by_user.setdefault(key[0], {})[key] = op
+        return by_user
+
+    def stats(self):
+        with self._lock:
+            pending, inflight = len(self._pending), len(self._inflight)
+        return {"pending": pending, "inflight": inflight, "flushed": self.flushed}
+
+    def _ensure_thread(self):
+        # Se arranca en el primer uso para que cada worker de gunicorn tenga el suyo
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="favorites-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Favorites flush failed")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._inflight, self._pending = self._pending, {}
+            ops = self._inflight
+            try:
+                with self.app.app_context():
+                    self._write(ops)
+            except Exception:
+                with self._lock:
+                    self._requeue(ops)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+    def _requeue(self, ops):
+        for key, op in ops.items():
+            if key in self._pending:
+                del self._pending[key]
+            else:
+                self._pending[key] = op
+
+    def _write(self, ops):
+        adds = [key for key, op in ops.items() if op == ADD]
+        removes = [key for key, op in ops.items() if op == REMOVE]
+        try:
+            self._execute(adds, removes)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.flushed += len(ops)
+
+    def _execute(self, adds, removes):
+        table = Favorite.__table__
+        for start in range(0, len(removes), ROWS_PER_STATEMENT):
+            chunk = removes[start:start + ROWS_PER_STATEMENT]
+            db.session.execute(table.delete().where(or_(*[_match(key) for key in chunk])))
+        for start in range(0, len(adds), ROWS_PER_STATEMENT):
+            db.session.execute(_insert_missing(adds[start:start + ROWS_PER_STATEMENT]))
+
+favorite_buffer = FavoriteBuffer()
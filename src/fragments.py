@@ -0,0 +1,140 @@
+import json
+import threading
+from collections import OrderedDict
+from flask import Response
+from sqlalchemy import event
+from models import Episode, Location
+
+# Caché de fragmentos JSON ya codificados para las entidades que se incrustan en
+# casi todas las respuestas (Location como origin/location, Episode dentro de
+# Character). Cada entrada se guarda con la versión de la fila: si la fila que
+# se acaba de cargar trae otra versión, el fragmento se recalcula. La versión es
+# una marca de tiempo (models.next_version) que se asigna en cada INSERT y
+# UPDATE, de modo que una fila borrada y recreada con el mismo id tampoco
+# coincide con la entrada antigua en otros procesos. Los eventos de escritura
+# solo liberan memoria antes de tiempo. La excepción son las filas insertadas
+# con SQL a mano sin versión, que toman el valor por defecto 1.
+#
+# Las respuestas se montan pegando fragmentos en vez de construir diccionarios.
+
+def encode(value):
+    # Mismo formato que jsonify: claves ordenadas y sin espacios
+    return json.dumps(value, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def splice_object(fields):
+    """Une {clave: bytes JSON} en un objeto JSON, con las claves ordenadas."""
+    return b"{" + b",".join(encode(key) + b":" + fields[key] for key in sorted(fields)) + b"}"
+
+def splice_array(items):
+    return b"[" + b",".join(items) + b"]"
+
+def json_response(body, status=200):
+    return Response(body + b"\n", status=status, mimetype="application/json")
+
+class FragmentCache:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, obj, serializer):
+        key = (type(obj).__name__, obj.id)
+        version = obj.version
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        fragment = encode(serializer(obj))
+        with self._lock:
+            self._entries[key] = (version, fragment)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return fragment
+
+    def invalidate(self, model_name, id):
+        with self._lock:
+            if self._entries.pop((model_name, id), None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+            hits, misses = self.hits, self.misses
+            evictions, invalidations = self.evictions, self.invalidations
+        total = hits + misses
+        return {
+            "size": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "evictions": evictions,
+            "invalidations": invalidations,
+        }
+
+fragment_cache = FragmentCache()
+
+def _invalidate(mapper, connection, target):
+    fragment_cache.invalidate(type(target).__name__, target.id)
+
+for model in (Location, Episode):
+    event.listen(model, "after_update", _invalidate)
+    event.listen(model, "after_delete", _invalidate)
+
+# Constructores de respuesta
+
+def location_fragment(location):
+    return fragment_cache.get(location, Location.serialize) if location else b"null"
+
+def episode_fragment(episode):
+    return fragment_cache.get(episode, Episode.serialize_basic)
+
+def encode_character(character):
+    return splice_object({
+        "id": encode(character.id),
+        "name": encode(character.name),
+        "status": encode(character.status),
+        "species": encode(character.species),
+        "gender": encode(character.gender),
+        "origin": location_fragment(character.origin),
+        "location": location_fragment(character.location),
+        "image": encode(character.image),
+        "episodes": splice_array([episode_fragment(episode) for episode in character.episodes]),
+    })
+
+def _splice_favorite(id, email, character, episode, location):
+    return splice_object({
+        "id": encode(id),
+        "user": encode(email),
+        "character": encode_character(character) if character else b"null",
+        "episode": encode(episode.serialize()) if episode else b"null",
+        "location": location_fragment(location),
+    })
+
+def encode_favorite(favorite):
+    return _splice_favorite(favorite.id, favorite.user.email if favorite.user else None,
+                            favorite.character, favorite.episode, favorite.location)
+
+def encode_pending_favorite(email, character, episode, location):
+    """Favorito que sigue en el buffer de write-behind: misma forma, sin id."""
+    return _splice_favorite(None, email, character, episode, location)
+
+def encode_user(user, favorites=None):
+    """favorites: lista opcional de fragmentos ya codificados que sustituye a user.favorites."""
+    if favorites is None:
+        favorites = [encode_favorite(favorite) for favorite in user.favorites]
+    return splice_object({
+        "id": encode(user.id),
+        "email": encode(user.email),
+        "is_active": encode(user.is_active),
+        "favorites": splice_array(favorites),
+    })
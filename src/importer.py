@@ -0,0 +1,296 @@
+import csv
+import io
+import json
+import os
+from collections import Counter
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Character, Episode, Location, character_episode, next_version
+
+# Importación masiva desde los dumps públicos de Rick and Morty (JSON o NDJSON).
+#
+# Cada etapa (locations -> episodes -> characters) lee el fichero en streaming,
+# asigna ids propios de forma determinista (base + posición en el fichero) y
+# escribe por lotes: COPY en Postgres, executemany en el resto. Cada lote va en
+# su propia transacción, así que solo el primero tras reanudar puede estar ya
+# escrito (si el proceso murió antes de guardar el checkpoint): ese lote borra
+# antes su rango de ids y los demás se insertan sin borrar nada.
+#
+# Pensado para ejecutarse con las escrituras de la API en pausa: los ids se
+# reservan a partir del máximo actual de cada tabla, y una fila creada por la
+# API dentro de ese rango hace fallar el lote por clave primaria.
+
+STAGES = ("locations", "episodes", "characters")
+# Etapas cuyo mapa de ids (id de origen -> id propio) necesitan las siguientes.
+# El mapa solo se guarda en el checkpoint al completar la etapa; si se reanuda a
+# medias, se reconstruye con los registros ya escritos (sus ids son deterministas).
+MAPPED_STAGES = ("locations", "episodes")
+# Etapas que deben estar completas en el checkpoint antes de cada etapa
+REQUIRED_STAGES = {"characters": ("locations", "episodes")}
+
+def iter_records(path, chunk_size=1 << 16):
+    """Devuelve los objetos de un array JSON o de un fichero NDJSON sin cargarlo entero."""
+    with open(path, encoding="utf-8") as fp:
+        head = fp.read(chunk_size)
+        stripped = head.lstrip()
+        if not stripped.startswith("["):
+            for line in _iter_lines(head, fp):
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf = stripped[1:]
+        pos = 0
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos == len(buf):
+                    raise ValueError
+                record, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                more = fp.read(chunk_size)
+                if not more:
+                    raise click.ClickException("Unexpected end of JSON array in " + path)
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield record
+
+def _iter_lines(head, fp):
+    rest = ""
+    chunk = head
+    while chunk:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+        chunk = fp.read(1 << 16)
+    yield rest
+
+def ref_id(value):
+    """Extrae el id de origen de una referencia: 3, "3", ".../location/3" o {"url": ...}."""
+    if isinstance(value, dict):
+        value = value.get("url")
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    tail = str(value).rstrip("/").rsplit("/", 1)[-1]
+    return int(tail) if tail.isdigit() else None
+
+def _text(value, default=None):
+    return value if value not in (None, "") else default
+
+# Escritura por lotes
+
+def insert_rows(conn, table, rows):
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        columns = list(rows[0].keys())
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (table.name, ", ".join(columns)), buf)
+        finally:
+            cursor.close()
+    else:
+        conn.execute(table.insert(), rows)
+
+def sync_sequence(conn, table):
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            "SELECT setval(pg_get_serial_sequence('%s', 'id'), (SELECT MAX(id) FROM %s))" % (table.name, table.name))
+
+# Checkpoint
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+def save_checkpoint(path, checkpoint):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(checkpoint, fp)
+    os.replace(tmp, path)
+
+class References:
+    """Resuelve referencias de origen con los mapas de ids y cuenta las que no existen."""
+    def __init__(self, maps):
+        self.maps = maps
+        self.unresolved = Counter()
+
+    def resolve(self, stage, value):
+        source_id = ref_id(value)
+        if source_id is None:
+            return None
+        id = self.maps[stage].get(str(source_id))
+        if id is None:
+            self.unresolved[stage] += 1
+        return id
+
+# Etapas
+
+def location_row(record, id, refs):
+    return {
+        "id": id,
+        "name": _text(record.get("name"), "unknown"),
+        "type": _text(record.get("type")),
+        "dimension": _text(record.get("dimension")),
+        "version": next_version(None),
+    }
+
+def episode_row(record, id, refs):
+    return {
+        "id": id,
+        "name": _text(record.get("name"), "unknown"),
+        "air_date": _text(record.get("air_date")),
+        "episode_code": _text(record.get("episode_code") or record.get("episode"), "unknown"),
+        "version": next_version(None),
+    }
+
+def character_row(record, id, refs):
+    return {
+        "id": id,
+        "name": _text(record.get("name"), "unknown"),
+        "status": _text(record.get("status"), "unknown"),
+        "species": _text(record.get("species"), "unknown"),
+        "gender": _text(record.get("gender"), "unknown"),
+        "origin_id": refs.resolve("locations", record.get("origin")),
+        "location_id": refs.resolve("locations", record.get("location")),
+        "image": _text(record.get("image")),
+    }
+
+def character_links(record, id, refs):
+    links = []
+    seen = set()
+    for ref in record.get("episode") or record.get("episodes") or ():
+        episode_id = refs.resolve("episodes", ref)
+        if episode_id is not None and episode_id not in seen:
+            seen.add(episode_id)
+            links.append({"character_id": id, "episode_id": episode_id})
+    return links
+
+STAGE_SPECS = {
+    "locations": (Location.__table__, location_row, None),
+    "episodes": (Episode.__table__, episode_row, None),
+    "characters": (Character.__table__, character_row, character_links),
+}
+
+def write_batch(table, rows, links, replace=False):
+    """replace: borra antes el rango de ids del lote, por si ya se escribió."""
+    first_id, last_id = rows[0]["id"], rows[-1]["id"]
+    try:
+        with db.engine.begin() as conn:
+            if replace:
+                if table is Character.__table__:
+                    conn.execute(character_episode.delete().where(
+                        character_episode.c.character_id.between(first_id, last_id)))
+                conn.execute(table.delete().where(table.c.id.between(first_id, last_id)))
+            insert_rows(conn, table, rows)
+            insert_rows(conn, character_episode, links)
+            sync_sequence(conn, table)
+    except IntegrityError as error:
+        raise click.ClickException(
+            "%s ids %d-%d are already in use (%s); pause API writes while importing" % (
+                table.name, first_id, last_id, error.orig))
+
+def run_stage(name, path, checkpoint, checkpoint_path, batch_size):
+    table, make_row, make_links = STAGE_SPECS[name]
+    state = checkpoint.get(name)
+    if state and state["path"] != os.path.abspath(path):
+        raise click.ClickException(
+            "Checkpoint for %s was created from %s, use --restart to start over" % (name, state["path"]))
+    if state and state["complete"]:
+        click.echo("%s: already imported, skipping" % name)
+        return
+    if not state:
+        with db.engine.connect() as conn:
+            base = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+        state = checkpoint[name] = {
+            "path": os.path.abspath(path), "base": base, "done": 0, "complete": False,
+        }
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    for required in REQUIRED_STAGES.get(name, ()):
+        if not checkpoint.get(required, {}).get("complete"):
+            raise click.ClickException(
+                "%s reference %s: import them first with --%s and the same checkpoint" % (name, required, required))
+
+    refs = References({stage: checkpoint.get(stage, {}).get("map", {}) for stage in MAPPED_STAGES})
+    keep_map = name in MAPPED_STAGES
+    stage_map = {}
+    done = state["done"]
+    rows, links = [], []
+    link_count = 0
+    first_batch = True
+
+    def flush():
+        nonlocal first_batch
+        write_batch(table, rows, links, replace=first_batch)
+        first_batch = False
+        state["done"] += len(rows)
+        save_checkpoint(checkpoint_path, checkpoint)
+        click.echo("%s: %d records, %d links, %d unresolved references" % (
+            name, state["done"], link_count, sum(refs.unresolved.values())))
+        rows.clear()
+        links.clear()
+
+    for index, record in enumerate(iter_records(path)):
+        id = state["base"] + index
+        if keep_map and record.get("id") is not None:
+            stage_map[str(record["id"])] = id
+        if index < done:
+            continue
+        rows.append(make_row(record, id, refs))
+        if make_links:
+            new_links = make_links(record, id, refs)
+            links.extend(new_links)
+            link_count += len(new_links)
+        if len(rows) >= batch_size:
+            flush()
+    if rows:
+        flush()
+
+    for stage, count in sorted(refs.unresolved.items()):
+        click.echo("%s: %d references to unknown %s were left empty" % (name, count, stage), err=True)
+    if keep_map:
+        state["map"] = stage_map
+    state["complete"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+
+@click.command("import")
+@click.option("--locations", type=click.Path(exists=True, dir_okay=False), help="JSON/NDJSON dump of locations.")
+@click.option("--episodes", type=click.Path(exists=True, dir_okay=False), help="JSON/NDJSON dump of episodes.")
+@click.option("--characters", type=click.Path(exists=True, dir_okay=False), help="JSON/NDJSON dump of characters.")
+@click.option("--batch-size", default=5000, show_default=True, help="Records per transaction.")
+@click.option("--checkpoint", "checkpoint_path", default="import_checkpoint.json", show_default=True)
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint.")
+@with_appcontext
+def import_command(locations, episodes, characters, batch_size, checkpoint_path, restart):
+    """Importa locations, episodes y characters desde dumps locales.
+
+    Las escrituras de la API deben estar en pausa mientras dura la importación.
+    """
+    paths = {"locations": locations, "episodes": episodes, "characters": characters}
+    if not any(paths.values()):
+        raise click.UsageError("Pass at least one of --locations, --episodes or --characters")
+
+    checkpoint = {} if restart else load_checkpoint(checkpoint_path)
+    for name in STAGES:
+        if paths[name]:
+            run_stage(name, paths[name], checkpoint, checkpoint_path, batch_size)
+    click.echo("Import finished")
@@ -0,0 +1,69 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+
+# Contadores por ruta: peticiones, errores por código y un histograma de
+# latencias con cubetas fijas (en segundos).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class _RouteStats:
+    __slots__ = ("count", "total", "errors", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.errors = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+class RouteMetrics:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        @app.before_request
+        def start_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            start = g.pop("request_start", None)
+            if start is not None:
+                self.observe(request.endpoint or "<unmatched>", response.status_code, time.perf_counter() - start)
+            return response
+
+    def observe(self, endpoint, status, seconds):
+        with self._lock:
+            stats = self._routes.get(endpoint)
+            if stats is None:
+                stats = self._routes[endpoint] = _RouteStats()
+            stats.count += 1
+            stats.total += seconds
+            stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if status >= 400:
+                stats.errors[status] = stats.errors.get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            routes = {}
+            for endpoint, stats in self._routes.items():
+                errors = sum(stats.errors.values())
+                cumulative = 0
+                histogram = {}
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    histogram["le_" + str(bound)] = cumulative
+                routes[endpoint] = {
+                    "count": stats.count,
+                    "errors": {str(status): count for status, count in sorted(stats.errors.items())},
+                    "error_rate": round(errors / stats.count, 4),
+                    "mean_latency": round(stats.total / stats.count, 6),
+                    "latency_histogram": histogram,
+                }
+        return routes
+
+route_metrics = RouteMetrics()
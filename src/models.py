@@ -1,14 +1,24 @@
+import time
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Integer, String, Boolean, ForeignKey, Table
+from sqlalchemy import Integer, BigInteger, String, Boolean, ForeignKey, Table, Index, func
 from sqlalchemy.orm import relationship
 from werkzeug.security import generate_password_hash
 
 db = SQLAlchemy()
 
+def next_version(current):
+    """Marca de tiempo en microsegundos: no se repite aunque se borre y se recree el mismo id."""
+    return max((current or 0) + 1, time.time_ns() // 1000)
+
 # USER MODEL
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Solo en Postgres: sin INCLUDE sería un duplicado del índice único de email
+        Index('ix_users_email_login', 'email', postgresql_include=['id', 'password', 'is_active'])
+        .ddl_if(dialect='postgresql'),
+    )
     id = db.Column(Integer, primary_key=True)
     email = db.Column(String(120), unique=True, nullable=False)
     password = db.Column(String(256), nullable=False)  # Mayor seguridad
@@ -34,7 +44,8 @@ class User(db.Model):
 character_episode = db.Table(
     'character_episode',
     db.Column('character_id', db.Integer, db.ForeignKey('characters.id'), primary_key=True),
-    db.Column('episode_id', db.Integer, db.ForeignKey('episodes.id'), primary_key=True)
+    db.Column('episode_id', db.Integer, db.ForeignKey('episodes.id'), primary_key=True),
+    Index('ix_character_episode_episode_id', 'episode_id', 'character_id')
 )
 
 #  CHARACTER MODEL
@@ -46,8 +57,8 @@ class Character(db.Model):
     status = db.Column(db.String(50), nullable=False)
     species = db.Column(db.String(50), nullable=False)
     gender = db.Column(db.String(50), nullable=False)
-    origin_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=True)
-    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=True)
+    origin_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=True, index=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=True, index=True)
     image = db.Column(db.String(250), nullable=True)
 
     origin = relationship('Location', foreign_keys=[origin_id])
@@ -64,7 +75,18 @@ class Character(db.Model):
             "origin": self.origin.serialize() if self.origin else None,
             "location": self.location.serialize() if self.location else None,
             "image": self.image,
-            "episodes": [episode.serialize() for episode in self.episodes] if self.episodes else [],
+            "episodes": [episode.serialize_basic() for episode in self.episodes] if self.episodes else [],
+        }
+
+    def serialize_basic(self):
+        """Versión sin relaciones, para anidar dentro de Episode sin recursión."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "species": self.species,
+            "gender": self.gender,
+            "image": self.image,
         }
 
 # EPISODE MODEL
@@ -75,17 +97,30 @@ class Episode(db.Model):
     name = db.Column(db.String(120), nullable=False)
     air_date = db.Column(db.String(50), nullable=True)
     episode_code = db.Column(db.String(50), nullable=False)
+    # Cambia en cada INSERT y UPDATE; forma parte de la clave de la caché de fragmentos
+    version = db.Column(db.BigInteger, nullable=False, server_default="1")
 
     # Relación con Character (muchos a muchos)
     characters = db.relationship('Character', secondary=character_episode, back_populates='episodes')
 
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": next_version}
+
     def serialize(self):
         return {
             "id": self.id,
             "name": self.name,
             "air_date": self.air_date,
             "episode_code": self.episode_code,
-            "characters": [character.serialize() for character in self.characters] if self.characters else []
+            "characters": [character.serialize_basic() for character in self.characters] if self.characters else []
+        }
+
+    def serialize_basic(self):
+        """Versión sin personajes, para anidar dentro de Character sin recursión."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "air_date": self.air_date,
+            "episode_code": self.episode_code,
         }
 
 # LOCATION MODEL
@@ -96,6 +131,9 @@ class Location(db.Model):
     name = db.Column(String(120), nullable=False)
     type = db.Column(String(50), nullable=True)
     dimension = db.Column(String(50), nullable=True)
+    version = db.Column(BigInteger, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": next_version}
 
     def serialize(self):
         return {
@@ -109,11 +147,14 @@ class Location(db.Model):
 
 class Favorite(db.Model):
     __tablename__ = 'favorites'
+    __table_args__ = (
+        Index('ix_favorites_user_lookup', 'user_id', 'character_id', 'episode_id', 'location_id'),
+    )
     id = db.Column(Integer, primary_key=True)
     user_id = db.Column(Integer, ForeignKey('users.id'), nullable=False)
-    character_id = db.Column(Integer, ForeignKey('characters.id'), nullable=True)
-    episode_id = db.Column(Integer, ForeignKey('episodes.id'), nullable=True)
-    location_id = db.Column(Integer, ForeignKey('locations.id'), nullable=True)
+    character_id = db.Column(Integer, ForeignKey('characters.id'), nullable=True, index=True)
+    episode_id = db.Column(Integer, ForeignKey('episodes.id'), nullable=True, index=True)
+    location_id = db.Column(Integer, ForeignKey('locations.id'), nullable=True, index=True)
 
     user = relationship('User', back_populates='favorites')
     character = relationship('Character')
@@ -128,3 +169,14 @@ class Favorite(db.Model):
             "episode": self.episode.serialize() if self.episode else None,
             "location": self.location.serialize() if self.location else None,
         }
+
+# Un mismo favorito no puede repetirse; COALESCE porque los NULL no cuentan
+# como iguales en un índice único
+Index(
+    'uq_favorites_target',
+    Favorite.user_id,
+    func.coalesce(Favorite.character_id, 0),
+    func.coalesce(Favorite.episode_id, 0),
+    func.coalesce(Favorite.location_id, 0),
+    unique=True,
+)
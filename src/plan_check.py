@@ -0,0 +1,105 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func, select
+from models import db, User, Character, Episode, Location
+from utils import MAX_ID
+
+# Comprobación de planes de consulta: ejecuta las rutas de src/app.py que
+# buscan por clave, captura cada SELECT que llega a la base de datos y lo pasa
+# por EXPLAIN. Falla si alguna consulta recorre entera una tabla con más filas
+# que el umbral. Los listados completos (GET /characters, ...) no se incluyen:
+# leer toda la tabla es lo que se les pide.
+
+def sample_requests():
+    """Peticiones (método, ruta, json) sobre ids que existen en la base de datos."""
+    character_id = db.session.scalar(select(func.min(Character.id))) or 1
+    episode_id = db.session.scalar(select(func.min(Episode.id))) or 1
+    location_id = db.session.scalar(select(func.min(Location.id))) or 1
+    user = db.session.scalars(select(User).order_by(User.id).limit(1)).first()
+    user_id = user.id if user else 1
+    email = user.email if user else "nobody@example.com"
+    return [
+        ("GET", "/users/%d" % user_id, None),
+        ("GET", "/characters/%d" % character_id, None),
+        ("GET", "/characters?ids=%d,%d" % (character_id, character_id + 1), None),
+        ("GET", "/episodes/%d" % episode_id, None),
+        ("GET", "/episodes?ids=%d,%d" % (episode_id, episode_id + 1), None),
+        ("GET", "/locations/%d" % location_id, None),
+        ("GET", "/locations?ids=%d,%d" % (location_id, location_id + 1), None),
+        ("POST", "/login", {"email": email, "password": "not-the-password"}),
+        # Sin ningún id: se valida el usuario y se corta antes de escribir
+        ("POST", "/users/%d/favorites" % user_id, {"character_id": None}),
+        ("DELETE", "/users/%d/favorites" % user_id, {"character_id": character_id, "episode_id": MAX_ID}),
+    ]
+
+def capture_statements(app, requests):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    token = create_access_token(identity="plan-check")
+    headers = {"Authorization": "Bearer " + token}
+    client = app.test_client()
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for method, path, body in requests:
+            before = len(statements)
+            client.open(path, method=method, json=body, headers=headers)
+            for index in range(before, len(statements)):
+                statements[index] = (method + " " + path,) + statements[index]
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+def table_rows(conn, table):
+    if conn.dialect.name == "postgresql":
+        estimate = conn.exec_driver_sql(
+            "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%(table)s)", {"table": table}).scalar()
+        # -1 (PG14+) o 0: la tabla no se ha analizado todavía, p. ej. tras un flask import
+        if estimate is not None and estimate > 0:
+            return estimate
+    return conn.exec_driver_sql('SELECT COUNT(*) FROM "%s"' % table).scalar()
+
+def scanned_tables(conn, statement, parameters):
+    """Tablas que el plan recorre enteras (Seq Scan en Postgres, SCAN sin índice en SQLite)."""
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        tables = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                tables.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", ()))
+        return tables
+
+    tables = []
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+        detail = row[-1].split()
+        if detail[0] == "SCAN" and "USING" not in detail and detail[1] != "CONSTANT":
+            # SQLite < 3.36 escribe "SCAN TABLE nombre"
+            tables.append(detail[2] if detail[1] == "TABLE" else detail[1])
+    return tables
+
+@click.command("check-plans")
+@click.option("--threshold", default=1000, show_default=True, help="Max rows a full table scan may touch.")
+@with_appcontext
+def check_plans_command(threshold):
+    """Falla si alguna consulta de los endpoints hace un seq scan sobre una tabla grande."""
+    app = current_app._get_current_object()
+    statements = capture_statements(app, sample_requests())
+    failures = 0
+    with db.engine.connect() as conn:
+        for source, statement, parameters in statements:
+            for table in scanned_tables(conn, statement, parameters):
+                rows = table_rows(conn, table)
+                if rows > threshold:
+                    failures += 1
+                    click.echo("%s: sequential scan on %s (%d rows)\n    %s" % (source, table, rows, " ".join(statement.split())))
+    click.echo("%d queries checked, %d sequential scans above %d rows" % (len(statements), failures, threshold))
+    if failures:
+        raise SystemExit(1)
@@ -1,4 +1,7 @@
-from flask import jsonify, url_for
+import hashlib
+import json
+import re
+from flask import Response, jsonify, request, url_for
 
 class APIException(Exception):
     status_code = 400
@@ -12,9 +15,33 @@ class APIException(Exception):
 
     def to_dict(self):
         rv = dict(self.payload or ())
-        rv['message'] = self.message
+        rv['msg'] = self.message
         return rv
 
+# Mayor valor de una columna INTEGER en Postgres; ids mayores no pueden existir
+MAX_ID = 2**31 - 1
+
+def parse_id_list(raw, limit):
+    """Convierte "1,2,3" en [1, 2, 3] sin duplicados y respetando el orden."""
+    ids = []
+    seen = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        # isdigit() a secas acepta dígitos Unicode como "²", que int() rechaza
+        if not (part.isascii() and part.isdigit()) or int(part) > MAX_ID:
+            raise ValueError("Invalid id: " + part)
+        value = int(part)
+        if value not in seen:
+            seen.add(value)
+            ids.append(value)
+    if not ids:
+        raise ValueError("At least one id is required")
+    if len(ids) > limit:
+        raise ValueError("Too many ids, the limit is " + str(limit))
+    return ids
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -39,3 +66,59 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+
+# Catálogo de rutas precalculado: se genera una sola vez al arrancar y se sirve
+# siempre desde los mismos bytes, con ETag para que los sondeos reciban un 304.
+
+RULE_ARGUMENT = re.compile(r"<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>")
+OPENAPI_TYPES = {"int": "integer", "float": "number"}
+
+class Precomputed:
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+
+    def response(self):
+        response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+def is_public_rule(rule):
+    return rule.endpoint != "static" and not rule.rule.startswith("/admin")
+
+def generate_openapi(app):
+    paths = {}
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if not is_public_rule(rule):
+            continue
+        path = RULE_ARGUMENT.sub(r"{\2}", rule.rule)
+        parameters = [{
+            "name": name,
+            "in": "path",
+            "required": True,
+            "schema": {"type": OPENAPI_TYPES.get(converter, "string")},
+        } for converter, name in RULE_ARGUMENT.findall(rule.rule)]
+        view = app.view_functions[rule.endpoint]
+        summary = (view.__doc__ or rule.endpoint).strip().splitlines()[0]
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            operation = {"operationId": rule.endpoint, "summary": summary}
+            if parameters:
+                operation["parameters"] = parameters
+            paths.setdefault(path, {})[method.lower()] = operation
+    return {
+        "openapi": "3.0.3",
+        "info": {"title": app.name, "version": "1.0.0"},
+        "paths": paths,
+    }
+
+def build_route_catalog(app):
+    """Se llama una vez, después de registrar todas las rutas."""
+    with app.test_request_context():
+        sitemap = generate_sitemap(app)
+    openapi = json.dumps(generate_openapi(app), separators=(",", ":"), sort_keys=True)
+    return {
+        "sitemap": Precomputed(sitemap.encode("utf-8"), "text/html"),
+        "openapi": Precomputed(openapi.encode("utf-8"), "application/json"),
+    }